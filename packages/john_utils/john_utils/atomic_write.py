@@ -0,0 +1,24 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """
+    Yields a temp path to write the new 'path' to, then swaps it in with
+    os.replace(). Rewriting the file in place would pull the pages out from
+    under anything that still maps the old one (SIGBUS on Linux); Windows
+    refuses the replace itself with PermissionError while a mapping is open.
+    Whatever fails, the temp file is removed and the error propagates.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,277 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+from typing import (
+    Any, ClassVar, Dict, Iterable, Iterator, List, Literal, Mapping, Optional, Tuple,
+)
+
+from john_utils.atomic_write import atomic_write
+
+
+class FlatTrie:
+    """
+    A read-only radix trie stored as flat parallel arrays instead of nested
+    dicts. load() maps the file and views the arrays in place, so startup
+    parses nothing and only the pages a search touches are read.
+
+    Nodes are numbered in DFS preorder with the root at 0 and children in
+    byte order of their labels, so keys() returns words sorted. Every subtree
+    is the contiguous range [i, subtree_end[i]): the first child of i is
+    i + 1 and each child's subtree_end is the index of its next sibling.
+    Mirrors the save/load/keys subset of marisa_trie.BytesTrie.
+
+    Built and loaded tries hold the same types, so a mypyc build compiles
+    one fast path: the int arrays are memoryviews (over the built arrays or
+    the mapped file) and the labels are bytes, copied out on load, which
+    mypyc slices and compares natively.
+    """
+
+    MAGIC: ClassVar[bytes] = b"JTRI"
+    VERSION: ClassVar[int] = 2
+    # magic, version, node count, label bytes, posting lists, posting entries, doc key bytes
+    HEADER: ClassVar[struct.Struct] = struct.Struct("<4sIIIIII")
+
+    def __init__(self) -> None:
+        self._mmap: Optional[mmap.mmap] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # All edge labels, utf-8, back to back; node i's is labels[off[i]:off[i + 1]]
+        self.labels = b""
+        self.label_off = memoryview(array('I', [0, 0]))
+        self.subtree_end = memoryview(array('I', [1]))
+        # Posting list of node i, -1 if not a word; words with the same doc
+        # ids share one list. List j is post_ids[post_off[j]:post_off[j + 1]],
+        # holding indexes into doc_keys.
+        self.post_ref = memoryview(array('i', [-1]))
+        self.post_off = memoryview(array('I', [0]))
+        self.post_ids = memoryview(array('I'))
+        # doc_keys is decoded from its JSON bytes on first use
+        self._doc_keys: Optional[List[Any]] = []
+        self._doc_keys_json = memoryview(b"")
+
+    @property
+    def doc_keys(self) -> List[Any]:
+        if self._doc_keys is None:
+            self._doc_keys = json.loads(bytes(self._doc_keys_json))
+        return self._doc_keys
+
+    @classmethod
+    def from_words(cls, words: Mapping[str, Iterable[Any]]) -> "FlatTrie":
+        """Builds the trie from a {word: doc_ids} map."""
+        # Encode every word once and sort the bytes. In sorted order each
+        # run of words sharing a prefix is one subtree, and the shared part
+        # of the run is that node's radix label, so nodes come out directly
+        # in DFS preorder with no per-char dicts along the way.
+        entries = sorted(((word.encode('utf-8'), doc_ids) for word, doc_ids in words.items()),
+                         key=itemgetter(0))
+        keys: List[bytes] = [key for key, _ in entries]
+
+        trie = cls()
+        labels = bytearray()
+        label_off = array('I', [0])
+        parents: List[int] = []
+        post_ref = array('i')
+        post_off = array('I', [0])
+        post_ids = array('I')
+        doc_index: Dict[Any, int] = {}
+        posting_intern: Dict[Tuple[int, ...], int] = {}  # sorted doc key indexes -> posting list index
+
+        # (first key, end key, label start, parent). The root has an empty
+        # label; any other node's label runs to the common prefix of its
+        # first and last key, which sorting makes the prefix of the run.
+        stack: List[Tuple[int, int, int, int]] = [(0, len(keys), 0, -1)]
+        while stack:
+            lo, hi, start, parent = stack.pop()
+            index = len(parents)
+            parents.append(parent)
+
+            end = start
+            if parent >= 0:
+                first, last = keys[lo], keys[hi - 1]
+                end = start + 1  # siblings were split on the byte at `start`
+                while end < len(first) and end < len(last) and first[end] == last[end]:
+                    end += 1
+                labels += first[start:end]
+            label_off.append(len(labels))
+
+            # The shortest key, if it ends here, sorts first
+            if lo < hi and len(keys[lo]) == end:
+                posting = tuple(sorted(doc_index.setdefault(doc_id, len(doc_index))
+                                       for doc_id in entries[lo][1]))
+                ref = posting_intern.get(posting)
+                if ref is None:
+                    ref = posting_intern[posting] = len(post_off) - 1
+                    post_ids.extend(posting)
+                    post_off.append(len(post_ids))
+                post_ref.append(ref)
+                lo += 1
+            else:
+                post_ref.append(-1)
+
+            # One child per distinct next byte. 0xFF never occurs in utf-8,
+            # so byte + 1 is always a valid upper bound to bisect for.
+            children: List[Tuple[int, int, int, int]] = []
+            while lo < hi:
+                bound = keys[lo][:end] + bytes((keys[lo][end] + 1,))
+                split = bisect_left(keys, bound, lo + 1, hi)
+                children.append((lo, split, end, index))
+                lo = split
+            stack.extend(reversed(children))
+
+        # Children come after their parent, so one backwards pass settles
+        # every subtree's end before its parent reads it.
+        subtree_end = array('I', range(1, len(parents) + 1))
+        for index in range(len(parents) - 1, 0, -1):
+            parent = parents[index]
+            if subtree_end[index] > subtree_end[parent]:
+                subtree_end[parent] = subtree_end[index]
+
+        trie.labels = bytes(labels)
+        trie.label_off = memoryview(label_off)
+        trie.subtree_end = memoryview(subtree_end)
+        trie.post_ref = memoryview(post_ref)
+        trie.post_off = memoryview(post_off)
+        trie.post_ids = memoryview(post_ids)
+        trie._doc_keys = list(doc_index)
+        return trie
+
+    @classmethod
+    def _file_size(cls, n_nodes: int, n_labels: int, n_posts: int,
+                   n_post_ids: int, n_doc_keys: int) -> int:
+        # Header, then the five 4-byte arrays, then the two byte blobs
+        n_ints = 3 * n_nodes + 1 + n_posts + 1 + n_post_ids
+        return cls.HEADER.size + 4 * n_ints + n_labels + n_doc_keys
+
+    @classmethod
+    def is_current(cls, path: str) -> bool:
+        """True if 'path' holds a complete index in this version's layout."""
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(cls.HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+        except OSError:
+            return False
+        if len(head) < cls.HEADER.size:
+            return False
+        magic, version, n_nodes, n_labels, n_posts, n_post_ids, n_doc_keys = \
+            cls.HEADER.unpack(head)
+        return (magic == cls.MAGIC and version == cls.VERSION
+                and size == cls._file_size(n_nodes, n_labels, n_posts, n_post_ids, n_doc_keys))
+
+    def save(self, path: str) -> None:
+        doc_keys = json.dumps(self.doc_keys, separators=(',', ':')).encode('utf-8')
+        with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(
+                self.MAGIC, self.VERSION, len(self.subtree_end), len(self.labels),
+                len(self.post_off) - 1, len(self.post_ids), len(doc_keys),
+            ))
+            # 4-byte arrays first, byte blobs last
+            for arr in (self.label_off, self.subtree_end,
+                        self.post_ref, self.post_off, self.post_ids):
+                f.write(arr.tobytes())
+            f.write(self.labels)
+            f.write(doc_keys)
+
+    def load(self, path: str) -> "FlatTrie":
+        self.close()
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.HEADER.size:
+                raise ValueError(f"{path} is not a trie index")
+            # The mapping stays valid after the file is closed
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_nodes, n_labels, n_posts, n_post_ids, n_doc_keys = \
+            self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a version {self.VERSION} trie index")
+
+        if len(data) != self._file_size(n_nodes, n_labels, n_posts, n_post_ids, n_doc_keys):
+            raise ValueError(f"{path} is truncated")
+
+        view = memoryview(data)
+        offset = self.HEADER.size
+
+        def take(typecode: Literal['I', 'i'], count: int) -> memoryview:
+            nonlocal offset
+            arr = view[offset:offset + 4 * count].cast(typecode)
+            offset += 4 * count
+            return arr
+
+        self.label_off = take('I', n_nodes + 1)
+        self.subtree_end = take('I', n_nodes)
+        self.post_ref = take('i', n_nodes)
+        self.post_off = take('I', n_posts + 1)
+        self.post_ids = take('I', n_post_ids)
+        # Copied out so built and loaded tries both hold bytes here
+        self.labels = view[offset:offset + n_labels].tobytes()
+        offset += n_labels
+        self._doc_keys_json = view[offset:offset + n_doc_keys]
+        self._doc_keys = None
+        self._mmap = data
+        return self
+
+    def close(self) -> None:
+        """
+        Unmaps a loaded file and leaves the trie empty. An iterkeys()
+        iterator already under way raises ValueError after.
+        """
+        data = self._mmap
+        if data is None:
+            return
+        views = (self.label_off, self.subtree_end, self.post_ref,
+                 self.post_off, self.post_ids, self._doc_keys_json)
+        self._mmap = None
+        self._reset()
+        for view in views:
+            view.release()
+        data.close()
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """Returns every word starting with 'prefix'."""
+        return list(self.iterkeys(prefix))
+
+    def iterkeys(self, prefix: str = "") -> Iterator[str]:
+        """Yields the words starting with 'prefix', in sorted order."""
+        labels, label_off, subtree_end = self.labels, self.label_off, self.subtree_end
+        target = prefix.encode('utf-8')
+
+        # 1. Walk down to the node covering the prefix. Edges may span
+        # several chars, and the prefix may end part-way along the last one.
+        node = 0
+        word = b""
+        while len(word) < len(target):
+            rest = target[len(word):]
+            child, stop = node + 1, subtree_end[node]
+            while child < stop:
+                label = labels[label_off[child]:label_off[child + 1]]
+                if rest.startswith(label) or label[:len(rest)] == rest:
+                    break
+                child = subtree_end[child]
+            else:
+                return
+            node = child
+            word += label
+
+        # 2. The subtree is one contiguous run of nodes in preorder, so scan
+        # it front to back. `parts` holds the labels along the current path,
+        # `ends` the matching subtree ends; pop both once we walk past one.
+        post_ref = self.post_ref
+        parts: List[bytes] = [word]
+        ends = [subtree_end[node]]
+        if post_ref[node] >= 0:
+            yield word.decode('utf-8')
+
+        for index in range(node + 1, ends[0]):
+            while ends[-1] <= index:
+                ends.pop()
+                parts.pop()
+            parts.append(labels[label_off[index]:label_off[index + 1]])
+            ends.append(subtree_end[index])
+
+            if post_ref[index] >= 0:
+                yield b"".join(parts).decode('utf-8')
@@ -1,16 +1,103 @@
 import os
+import csv
 import json
 import sys
-import pandas as pd
+import multiprocessing
+from functools import partial
+from itertools import islice
+
+from john_utils.atomic_write import atomic_write
+from john_utils.flat_trie import FlatTrie
+
+# csv rejects fields over 128 KiB by default; pandas had no limit
+CSV_FIELD_LIMIT = 2**31 - 1
+
+try:
+    import marisa_trie
+except ImportError:  # optional: fall back to FlatTrie
+    marisa_trie = None
+
+try:
+    import pyarrow.parquet as pq
+    import pyarrow.types as pa_types
+except ImportError:  # optional: only needed for .parquet sources
+    pq = pa_types = None
+
+
+def _parse_id(value):
+    # Keep numeric ids numeric, like the old pandas reader did
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _build_words(rows, separator, parse_ids=True):
+    """
+    Returns a {word: {doc_ids}} map for (doc_id, data_str) rows. CSV ids
+    arrive as text and go through _parse_id; typed ids (parse_ids=False)
+    are used as they are. Module level so multiprocessing workers can run it.
+    """
+    # word -> doc ids
+    words = {}
+    get_ids = words.get  # hot loop: hoist the method lookup
+    # Lowercasing the whole field before splitting it is only safe when the
+    # separator has no cased characters: otherwise lowering could add split
+    # points ("X" -> "x") or remove them ("AND" -> "and").
+    lower_field = not any(c.isalpha() or c.lower() != c.upper() for c in separator)
+
+    for raw_id, data_str in rows:
+        if not data_str:
+            continue
+
+        doc_id = _parse_id(raw_id) if parse_ids else raw_id
+
+        # Split by separator (e.g. ingredients list)
+        if lower_field:
+            items = data_str.lower().split(separator)
+        else:
+            items = [item.lower() for item in data_str.split(separator)]
+
+        for item in items:
+            # strip for consistent matching
+            word = item.strip()
+            if not word:
+                continue
+
+            doc_ids = get_ids(word)
+            if doc_ids is None:
+                doc_ids = words[word] = set()
+            doc_ids.add(doc_id)
+
+    return words
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 class TrieManager:
-    def __init__(self, source_csv, output_json, id_col, data_col, separator=';'):
+    # Rows handed to each worker when building with workers > 1
+    CHUNK_ROWS = 50_000
+
+    def __init__(self, source_csv, output_json, id_col, data_col, separator=';', workers=1):
+        # source_csv may also be a .parquet file (needs pyarrow).
+        # workers > 1 builds the trie in a multiprocessing.Pool; on spawn
+        # platforms the caller then needs an `if __name__ == "__main__":` guard.
         self.source_csv = os.path.abspath(source_csv)
         self.output_json = os.path.abspath(output_json)
+        self.output_marisa = self.output_json + ".marisa"
+        self.output_index = self.output_json + ".idx"
         self.id_col = id_col
         self.data_col = data_col
         self.separator = separator
-        self.trie_root = {}
+        self.workers = workers
+        self.trie = None  # marisa_trie.BytesTrie if installed, else FlatTrie
 
         # 1. Ensure Trie exists and is up to date
         self._generate_trie_if_needed()
@@ -24,97 +111,189 @@ class TrieManager:
         except OSError:
             return 0
 
-    def _add_to_trie(self, trie, word, doc_id):
-        node = trie
-        # strip and lower for consistent matching
-        clean_word = word.lower().strip()
-        if not clean_word:
-            return
+    def _output_path(self):
+        return self.output_marisa if marisa_trie is not None else self.output_index
 
-        for char in clean_word:
-            if char not in node:
-                node[char] = {}
-            node = node[char]
-        
-        if "__ids__" not in node:
-            node["__ids__"] = [] # Using list directly for JSON compatibility
-        
-        # Avoid duplicates in list if necessary, but list is faster for append
-        if doc_id not in node["__ids__"]:
-            node["__ids__"].append(doc_id)
+    def _output_is_current(self):
+        # An index written before a FlatTrie layout change needs rebuilding
+        return marisa_trie is not None or FlatTrie.is_current(self.output_index)
 
     def _generate_trie_if_needed(self):
+        output_path = self._output_path()
         input_mtime = self._get_file_mtime(self.source_csv)
-        output_mtime = self._get_file_mtime(self.output_json)
+        output_mtime = self._get_file_mtime(output_path)
 
-        if output_mtime > input_mtime and output_mtime > 0:
-            print(f"[{self.output_json}] is up to date. Skipping generation.")
+        if output_mtime > input_mtime and output_mtime > 0 and self._output_is_current():
+            print(f"[{output_path}] is up to date. Skipping generation.")
             return
 
         print(f"Source changed or output missing. Generating Trie from {self.source_csv}...")
         
         try:
-            # Only read necessary columns
-            df = pd.read_csv(self.source_csv, usecols=[self.id_col, self.data_col])
-        except (FileNotFoundError, ValueError) as e:
-            print(f"Error reading CSV: {e}")
-            self.trie_root = {}
+            temp_words = self._read_words()
+        except (FileNotFoundError, ValueError, csv.Error) as e:
+            print(f"Error reading source: {e}")
             return
 
-        temp_root = {}
-        for doc_id, data_str in zip(df[self.id_col], df[self.data_col]):
-            if pd.isna(data_str):
-                continue
-            
-            # Split by separator (e.g. ingredients list)
-            items = str(data_str).split(self.separator)
-            
-            for item in items:
-                self._add_to_trie(temp_root, item, doc_id)
-
-        # Save to JSON
-        os.makedirs(os.path.dirname(self.output_json), exist_ok=True)
-        with open(self.output_json, 'w', encoding='utf-8') as f:
-            # separators=(',', ':') removes whitespace to make file smaller
-            json.dump(temp_root, f, separators=(',', ':'))
+        # Our own mapping would block the replace on Windows
+        self.close()
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        try:
+            if marisa_trie is not None:
+                self._save_marisa(temp_words)
+            else:
+                self._save_index(temp_words)
+        except PermissionError as e:
+            # Someone else still maps the old file; keep it until next build
+            print(f"Error: could not replace {output_path}: {e}")
+            return
         
         print("Trie generation complete.")
 
+    def _check_columns(self, columns):
+        missing = [col for col in (self.id_col, self.data_col) if col not in columns]
+        if missing:
+            raise ValueError(f"Columns not found in {self.source_csv}: {missing}")
+
+    def _read_words(self):
+        """Streams the source row by row and returns a {word: {doc_ids}} map."""
+        if self.source_csv.lower().endswith('.parquet'):
+            return self._words_from_rows(self._parquet_rows(), parse_ids=False)
+
+        # The limit is process-wide, so put the caller's back afterwards
+        old_limit = csv.field_size_limit(CSV_FIELD_LIMIT)
+        try:
+            # utf-8-sig skips an Excel BOM
+            with open(self.source_csv, newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                self._check_columns(reader.fieldnames or ())
+
+                id_col, data_col = self.id_col, self.data_col
+                rows = ((row[id_col], row[data_col]) for row in reader)
+                return self._words_from_rows(rows)
+        finally:
+            csv.field_size_limit(old_limit)
+
+    def _parquet_rows(self):
+        if pq is None:
+            raise ValueError(f"Reading {self.source_csv} requires pyarrow")
+
+        parquet = pq.ParquetFile(self.source_csv)
+        schema = parquet.schema_arrow
+        self._check_columns(schema.names)
+
+        # _build_words splits text, so a list<string> or numeric data
+        # column has to be rejected here rather than failing mid-build
+        data_type = schema.field(self.data_col).type
+        if pa_types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        if not (pa_types.is_string(data_type) or pa_types.is_large_string(data_type)):
+            raise ValueError(
+                f"Column {self.data_col!r} in {self.source_csv} must hold strings, not {data_type}"
+            )
+        # Ids are kept exactly as stored, so only types that are safe as
+        # set members and in JSON are allowed: no lists, floats or decimals
+        id_type = schema.field(self.id_col).type
+        if pa_types.is_dictionary(id_type):
+            id_type = id_type.value_type
+        if not (pa_types.is_integer(id_type) or pa_types.is_string(id_type)
+                or pa_types.is_large_string(id_type)):
+            raise ValueError(
+                f"Column {self.id_col!r} in {self.source_csv} must hold integer or string ids, "
+                f"not {id_type}"
+            )
+
+        # Only the two columns are decoded, one record batch at a time;
+        # null fields come through as None and are skipped like empty ones.
+        id_col, data_col = self.id_col, self.data_col
+        batches = parquet.iter_batches(columns=[id_col, data_col])
+        return (
+            row
+            for batch in batches
+            for row in zip(batch.column(id_col).to_pylist(), batch.column(data_col).to_pylist())
+        )
+
+    def _words_from_rows(self, rows, parse_ids=True):
+        if self.workers <= 1:
+            return _build_words(rows, self.separator, parse_ids)
+        return self._read_words_parallel(rows, parse_ids)
+
+    def _read_words_parallel(self, rows, parse_ids=True):
+        # Parsing stays in this process (CSV quoted fields may span lines,
+        # so the file can't be split blindly); workers do the split/clean/insert
+        # work per chunk and the partial maps are unioned here.
+        temp_words = {}
+        build = partial(_build_words, separator=self.separator, parse_ids=parse_ids)
+        with multiprocessing.Pool(self.workers) as pool:
+            for words in pool.imap_unordered(build, _chunks(rows, self.CHUNK_ROWS)):
+                for word, doc_ids in words.items():
+                    merged = temp_words.get(word)
+                    if merged is None:
+                        temp_words[word] = doc_ids
+                    else:
+                        merged |= doc_ids
+        return temp_words
+
+    def _save_marisa(self, words):
+        # One record per word, doc ids packed as a compact JSON list
+        trie = marisa_trie.BytesTrie(
+            (word, json.dumps(list(doc_ids), separators=(',', ':')).encode('utf-8'))
+            for word, doc_ids in words.items()
+        )
+        with atomic_write(self.output_marisa) as tmp_path:
+            trie.save(tmp_path)
+
+    def _save_index(self, words):
+        FlatTrie.from_words(words).save(self.output_index)
+
     def _load_trie(self):
+        if marisa_trie is not None:
+            try:
+                # Mapped rather than read in: pages load as searches touch them
+                self.trie = marisa_trie.BytesTrie()
+                self.trie.mmap(self.output_marisa)
+            except (FileNotFoundError, RuntimeError):
+                print("Error: Could not load marisa trie.")
+                self.trie = None
+            return
+
         try:
-            with open(self.output_json, 'r', encoding='utf-8') as f:
-                self.trie_root = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Error: Could not load JSON trie.")
-            self.trie_root = {}
+            self.trie = FlatTrie()
+            self.trie.load(self.output_index)
+        except (FileNotFoundError, ValueError):
+            print("Error: Could not load trie index.")
+            self.trie = None
 
-    def search(self, prefix):
+    def reload(self):
+        """Rebuilds the trie if the source changed since, then loads it again."""
+        self._generate_trie_if_needed()
+        self._load_trie()
+
+    def close(self):
         """
-        Returns a list of full words starting with 'prefix'.
-        Returns empty list if input length < 1.
+        Releases the mapped trie file; search returns nothing until reload().
         """
-        if not prefix or len(prefix) < 1:
-            return []
+        if isinstance(self.trie, FlatTrie):
+            self.trie.close()
+        # marisa unmaps once the BytesTrie is freed
+        self.trie = None
 
-        prefix = prefix.lower()
-        node = self.trie_root
-        
-        # 1. Traverse to the end of the prefix
-        for char in prefix:
-            if char in node:
-                node = node[char]
-            else:
-                return []
-        
-        # 2. Collect all words from this point
-        results = []
-        self._dfs(node, prefix, results)
-        return results
-
-    def _dfs(self, node, current_word, results):
-        if "__ids__" in node:
-            results.append(current_word)
-        
-        for char, child_node in node.items():
-            if char != "__ids__":
-                self._dfs(child_node, current_word + char, results)
+    def search(self, prefix, limit=None):
+        """
+        Returns a list of full words starting with 'prefix', at most 'limit'
+        of them if given. Returns empty list if input length < 1.
+        """
+        if limit is None:
+            return list(self.iter_search(prefix))
+        return list(islice(self.iter_search(prefix), limit))
+
+    def iter_search(self, prefix):
+        """
+        Lazily yields the full words starting with 'prefix'. The walk stops
+        as soon as the caller does, so taking the first few completions of a
+        short prefix like "a" doesn't visit the whole subtree.
+        """
+        if not prefix or len(prefix) < 1 or self.trie is None:
+            return iter(())
+
+        return self.trie.iterkeys(prefix.lower())
@@ -0,0 +1,7 @@
+from john_utils import flat_trie
+
+
+def pytest_report_header(config):
+    # An in-place mypyc build (see pyproject.toml) shadows flat_trie.py
+    kind = "pure Python" if flat_trie.__file__.endswith(".py") else "mypyc-compiled"
+    return f"john_utils.flat_trie: {kind} ({flat_trie.__file__})"
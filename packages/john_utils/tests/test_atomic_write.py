@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from john_utils.atomic_write import atomic_write
+
+
+def test_replaces_on_success(tmp_path):
+    path = str(tmp_path / "out.bin")
+    with open(path, "wb") as f:
+        f.write(b"old")
+
+    with atomic_write(path) as tmp_path_:
+        with open(tmp_path_, "wb") as f:
+            f.write(b"new")
+        with open(path, "rb") as f:
+            assert f.read() == b"old"
+
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert os.listdir(tmp_path) == ["out.bin"]
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = str(tmp_path / "out.bin")
+    with open(path, "wb") as f:
+        f.write(b"old")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as tmp_path_:
+            with open(tmp_path_, "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError("write failed")
+
+    with open(path, "rb") as f:
+        assert f.read() == b"old"
+    assert os.listdir(tmp_path) == ["out.bin"]
+
+
+def test_refused_replace_removes_temp_file(monkeypatch, tmp_path):
+    path = str(tmp_path / "out.bin")
+
+    def refuse(src, dst):
+        raise PermissionError(13, "file in use", dst)
+
+    monkeypatch.setattr(os, "replace", refuse)
+    with pytest.raises(PermissionError):
+        with atomic_write(path) as tmp_path_:
+            with open(tmp_path_, "wb") as f:
+                f.write(b"new")
+    assert os.listdir(tmp_path) == []
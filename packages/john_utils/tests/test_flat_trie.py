@@ -0,0 +1,128 @@
+import struct
+
+import pytest
+
+from john_utils.flat_trie import FlatTrie
+
+# 'é' (c3 a9) and 'ü' (c3 bc) share their first utf-8 byte, so the trie
+# splits them mid-codepoint; the same goes for the CJK and emoji words.
+WORDS = {
+    "salt": [1, 2],
+    "salted butter": [2],
+    "sugar": [3],
+    "su": [4],
+    "s": [5],
+    "é": [6],
+    "éclair": [6, 7],
+    "ü": [8],
+    "über": [8],
+    "eclair": [9],
+    "e": ["x-1"],
+    "抹茶": [10],
+    "抹": [11],
+    "🍋 zest": [12],
+    "🍊": [12],
+}
+
+
+def _prefixes():
+    prefixes = {""}
+    for word in WORDS:
+        for end in range(1, len(word) + 1):
+            prefixes.add(word[:end])
+    return sorted(prefixes) + ["x", "sz", "éb", "ä", "抹x", "🍋 zesty", "saltier"]
+
+
+@pytest.fixture(params=["built", "loaded"])
+def trie(request, tmp_path):
+    built = FlatTrie.from_words(WORDS)
+    if request.param == "built":
+        yield built
+        return
+    path = str(tmp_path / "words.idx")
+    built.save(path)
+    loaded = FlatTrie().load(path)
+    yield loaded
+    loaded.close()
+
+
+@pytest.mark.parametrize("prefix", _prefixes())
+def test_keys_match_startswith(trie, prefix):
+    expected = sorted((w for w in WORDS if w.startswith(prefix)), key=lambda w: w.encode('utf-8'))
+    assert trie.keys(prefix) == expected
+    assert list(trie.iterkeys(prefix)) == expected
+
+
+def test_labels_split_mid_codepoint(trie):
+    labels = [bytes(trie.labels[trie.label_off[i]:trie.label_off[i + 1]])
+              for i in range(len(trie.subtree_end))]
+    assert b"\xc3" in labels
+
+
+def test_doc_keys_round_trip(trie):
+    assert sorted(map(str, trie.doc_keys)) == sorted({str(i) for ids in WORDS.values() for i in ids})
+
+
+def test_empty_trie(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    FlatTrie.from_words({}).save(path)
+    assert FlatTrie.is_current(path)
+
+    trie = FlatTrie().load(path)
+    assert trie.keys() == []
+    assert trie.keys("a") == []
+    assert FlatTrie().keys() == []
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = str(tmp_path / "words.idx")
+    FlatTrie.from_words(WORDS).save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    for size in (len(data) - 1, FlatTrie.HEADER.size, 10, 0):
+        with open(path, 'wb') as f:
+            f.write(data[:size])
+        assert not FlatTrie.is_current(path)
+        with pytest.raises(ValueError):
+            FlatTrie().load(path)
+
+
+def test_wrong_version_is_rejected(tmp_path):
+    path = str(tmp_path / "words.idx")
+    FlatTrie.from_words(WORDS).save(path)
+    with open(path, 'r+b') as f:
+        f.seek(len(FlatTrie.MAGIC))
+        f.write(struct.pack("<I", FlatTrie.VERSION - 1))
+
+    assert not FlatTrie.is_current(path)
+    with pytest.raises(ValueError, match="version"):
+        FlatTrie().load(path)
+
+
+def test_close_then_reload(tmp_path):
+    path = str(tmp_path / "words.idx")
+    FlatTrie.from_words(WORDS).save(path)
+
+    trie = FlatTrie().load(path)
+    trie.close()
+    assert trie.keys() == []
+    trie.close()
+
+    trie.load(path)
+    assert trie.keys("sal") == ["salt", "salted butter"]
+    # Saving over a file this process has mapped and closed again
+    FlatTrie.from_words({"pepper": [1]}).save(path)
+    assert trie.load(path).keys() == ["pepper"]
+
+
+def test_close_with_search_under_way(tmp_path):
+    path = str(tmp_path / "words.idx")
+    FlatTrie.from_words(WORDS).save(path)
+
+    trie = FlatTrie().load(path)
+    words = trie.iterkeys("s")
+    next(words)
+    trie.close()
+    with pytest.raises(ValueError):
+        list(words)
@@ -0,0 +1,218 @@
+import csv
+import os
+import struct
+
+import pytest
+
+from john_utils import trie_core
+from john_utils.flat_trie import FlatTrie
+from john_utils.trie_core import TrieManager
+
+ROWS = [
+    ("1", "Salt;Sugar;Flour"),
+    ("2", "salt; Pepper ;sage"),
+    ("3", ""),
+    ("4", "Saffron;;Éclair"),
+    ("5", "sugar"),
+]
+
+
+@pytest.fixture(params=["flat", "marisa"])
+def backend(request, monkeypatch):
+    if request.param == "flat":
+        monkeypatch.setattr(trie_core, "marisa_trie", None)
+    elif trie_core.marisa_trie is None:
+        pytest.skip("marisa-trie is not installed")
+    return request.param
+
+
+@pytest.fixture
+def source_csv(tmp_path):
+    path = tmp_path / "db.csv"
+    lines = ["id,ingredients"] + [f'{doc_id},"{data}"' for doc_id, data in ROWS]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _manager(source_csv, tmp_path, **kwargs):
+    return TrieManager(source_csv, str(tmp_path / "out" / "trie.json"), "id", "ingredients", **kwargs)
+
+
+def test_search(backend, source_csv, tmp_path):
+    manager = _manager(source_csv, tmp_path)
+    assert sorted(manager.search("s")) == ["saffron", "sage", "salt", "sugar"]
+    assert sorted(manager.search("SA")) == ["saffron", "sage", "salt"]
+    assert manager.search("é") == ["éclair"]
+    assert manager.search("x") == []
+    assert manager.search("") == []
+
+
+def test_missing_column_leaves_no_trie(source_csv, tmp_path):
+    manager = TrieManager(source_csv, str(tmp_path / "out" / "trie.json"), "id", "nope")
+    assert manager.trie is None
+    assert manager.search("s") == []
+
+
+def test_marisa_backend_writes_marisa_file(source_csv, tmp_path):
+    if trie_core.marisa_trie is None:
+        pytest.skip("marisa-trie is not installed")
+    manager = _manager(source_csv, tmp_path)
+    assert isinstance(manager.trie, trie_core.marisa_trie.BytesTrie)
+    assert sorted(manager.trie.keys("s")) == ["saffron", "sage", "salt", "sugar"]
+
+
+@pytest.mark.parametrize("damage", ["truncate", "old_version"])
+def test_damaged_index_is_rebuilt(monkeypatch, source_csv, tmp_path, damage):
+    monkeypatch.setattr(trie_core, "marisa_trie", None)
+    manager = _manager(source_csv, tmp_path)
+    manager.trie = None
+
+    with open(manager.output_index, 'r+b') as f:
+        if damage == "truncate":
+            f.truncate(os.path.getsize(manager.output_index) - 4)
+        else:
+            f.seek(len(FlatTrie.MAGIC))
+            f.write(struct.pack("<I", FlatTrie.VERSION - 1))
+    # Still newer than the source, so only the layout check can catch it
+    assert os.path.getmtime(manager.output_index) >= os.path.getmtime(source_csv)
+    assert not FlatTrie.is_current(manager.output_index)
+
+    rebuilt = _manager(source_csv, tmp_path)
+    assert FlatTrie.is_current(rebuilt.output_index)
+    assert sorted(rebuilt.search("sa")) == ["saffron", "sage", "salt"]
+
+
+def test_parallel_build_matches_serial(source_csv, tmp_path):
+    serial = _manager(source_csv, tmp_path)
+    parallel = TrieManager(source_csv, str(tmp_path / "par" / "trie.json"), "id", "ingredients", workers=2)
+    assert parallel._read_words() == serial._read_words()
+    assert parallel._read_words()["salt"] == {1, 2}
+
+
+def test_search_limit(backend, source_csv, tmp_path):
+    manager = _manager(source_csv, tmp_path)
+    everything = manager.search("s")
+    assert manager.search("s", limit=2) == everything[:2]
+    assert manager.search("s", limit=0) == []
+    assert manager.search("s", limit=100) == everything
+
+
+def test_iter_search_is_lazy(backend, source_csv, tmp_path):
+    manager = _manager(source_csv, tmp_path)
+    results = manager.iter_search("s")
+    assert not isinstance(results, list)
+    first = next(results)
+    assert [first] + list(results) == manager.search("s")
+    assert list(manager.iter_search("")) == []
+
+
+def _touch_source_after_output(manager, source_csv):
+    output_path = manager._output_path()
+    past = os.path.getmtime(output_path) - 10
+    os.utime(source_csv, (past + 5, past + 5))
+    os.utime(output_path, (past, past))
+
+
+def test_reload_picks_up_source_changes(backend, source_csv, tmp_path):
+    manager = _manager(source_csv, tmp_path)
+    with open(source_csv, "a", encoding="utf-8") as f:
+        f.write('6,"Sumac"\n')
+    _touch_source_after_output(manager, source_csv)
+
+    manager.reload()
+    assert "sumac" in manager.search("su")
+    manager.close()
+    assert manager.search("su") == []
+
+
+def test_replace_refused_keeps_old_trie(backend, monkeypatch, source_csv, tmp_path):
+    manager = _manager(source_csv, tmp_path)
+    with open(source_csv, "a", encoding="utf-8") as f:
+        f.write('6,"Sumac"\n')
+    _touch_source_after_output(manager, source_csv)
+
+    # What Windows does while another process still maps the file
+    def refuse(src, dst):
+        raise PermissionError(13, "file in use", dst)
+
+    monkeypatch.setattr(os, "replace", refuse)
+    manager.reload()
+    assert sorted(manager.search("su")) == ["sugar"]
+    assert not [name for name in os.listdir(tmp_path / "out") if name.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("separator, data, expected", [
+    (";", "Salt; PEPPER ;;sage", {"salt", "pepper", "sage"}),
+    ("|", "É|Ü", {"é", "ü"}),
+    # Cased separators split case-sensitively, before lowercasing
+    ("AND", "Salt AND Pepper and Sage", {"salt", "pepper and sage"}),
+    ("x", "KIWI|x|BOX", {"kiwi|", "|box"}),
+    (" and ", "SALT AND PEPPER and sage", {"salt and pepper", "sage"}),
+])
+def test_build_words_separator_case(separator, data, expected):
+    assert trie_core._build_words([("1", data)], separator) == {word: {1} for word in expected}
+
+
+def test_bom_and_long_fields(backend, tmp_path):
+    # Excel writes a BOM; pandas, which this replaced, also took fields
+    # past csv's 128 KiB default
+    path = tmp_path / "excel.csv"
+    long_field = ";".join(f"item{i}" for i in range(20_000)) + ";salt"
+    path.write_text(f'id,ingredients\n1,"Salt;Sugar"\n2,"{long_field}"\n', encoding="utf-8-sig")
+    limit = csv.field_size_limit()
+
+    manager = _manager(str(path), tmp_path)
+    assert sorted(manager.search("s")) == ["salt", "sugar"]
+    assert len(manager.search("item")) == 20_000
+    assert csv.field_size_limit() == limit
+
+
+def test_unparseable_csv_leaves_no_trie(monkeypatch, tmp_path):
+    path = tmp_path / "db.csv"
+    path.write_text('id,ingredients\n1,"' + "x" * 200 + '"\n', encoding="utf-8")
+    monkeypatch.setattr(trie_core, "CSV_FIELD_LIMIT", 100)
+
+    manager = _manager(str(path), tmp_path)
+    assert manager.trie is None
+    assert csv.field_size_limit() != 100
+
+
+def _parquet_source(tmp_path, ids, data):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "db.parquet")
+    pq.write_table(pa.table({"id": ids, "ingredients": data, "other": [0] * len(ids)}), path)
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parquet_matches_csv(backend, source_csv, tmp_path, workers):
+    pa = pytest.importorskip("pyarrow")
+    ids = [int(doc_id) for doc_id, _ in ROWS]
+    data = pa.array([text or None for _, text in ROWS]).dictionary_encode()
+    path = _parquet_source(tmp_path, ids, data)
+
+    from_csv = _manager(source_csv, tmp_path / "csv")
+    from_parquet = _manager(path, tmp_path / "parquet", workers=workers)
+    assert from_parquet._read_words() == from_csv._read_words()
+    assert sorted(from_parquet.search("s")) == sorted(from_csv.search("s"))
+
+
+def test_parquet_ids_are_kept_as_stored(monkeypatch, tmp_path):
+    monkeypatch.setattr(trie_core, "marisa_trie", None)
+    path = _parquet_source(tmp_path, ["007", "7", "x"], ["salt", "salt", "salt"])
+    manager = _manager(path, tmp_path)
+    assert manager._read_words() == {"salt": {"007", "7", "x"}}
+    assert sorted(manager.trie.doc_keys) == ["007", "7", "x"]
+
+
+@pytest.mark.parametrize("ids, data", [
+    ([1], [["salt", "sugar"]]),    # list<string> data
+    ([1], [3.5]),                  # numeric data
+    ([[1]], ["salt"]),             # list ids
+    ([1.2, 1.7], ["salt", "salt"]),  # float ids would collapse or overflow
+])
+def test_parquet_wrong_column_types_are_rejected(tmp_path, ids, data):
+    path = _parquet_source(tmp_path, ids, data)
+    manager = _manager(path, tmp_path)
+    assert manager.trie is None
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
 
 from PyQt6.QtCore import Qt, QPoint, QRect, QSize, QEvent
 from PyQt6.QtWidgets import (
@@ -22,9 +24,23 @@ class FlowLayout(QLayout):
     def __init__(self, parent: Optional[QWidget] = None) -> None:
         super().__init__(parent)
         self._item_list: List[QLayoutItem] = []
+        # (base_point, force_new_line) per item, snapshotted on insertion so
+        # layout passes don't go through Qt's property system
+        self._item_meta: List[Tuple[Optional[int], bool]] = []
         self._line_debug_positions: List[Tuple[int, int]] = []
 
-        # Configuration
+        # Layout results, dropped whenever the layout is invalidated
+        self._height_cache: Dict[int, int] = {}
+        self._min_size_cache: Optional[QSize] = None
+        self._last_geom_rect: Optional[QRect] = None
+        # Per-item measurements shared by every width query, see _measure()
+        self._sizes: Optional[List[QSize]] = None
+        self._ascents: List[int] = []
+        self._cum_widths: List[int] = []
+        self._cum_spacing: int = 0
+        self._break_indexes: List[int] = []
+
+        # Configuration (call invalidate() after changing these)
         self.grid_enabled: bool = False
         self.grid_size: int = 20
         self.grid_offset: int = 0
@@ -39,6 +55,8 @@ class FlowLayout(QLayout):
 
     def addItem(self, item: QLayoutItem) -> None:  # type: ignore[override]
         self._item_list.append(item)
+        self._item_meta.append(self._read_meta(item))
+        self._clear_caches()
 
     def count(self) -> int:  # type: ignore[override]
         return len(self._item_list)
@@ -50,6 +68,8 @@ class FlowLayout(QLayout):
 
     def takeAt(self, index: int) -> Optional[QLayoutItem]:  # type: ignore[override]
         if 0 <= index < len(self._item_list):
+            self._clear_caches()
+            del self._item_meta[index]
             return self._item_list.pop(index)
         return None
 
@@ -60,38 +80,105 @@ class FlowLayout(QLayout):
         return True
 
     def heightForWidth(self, width: int) -> int:  # type: ignore[override]
-        return self._do_layout(QRect(0, 0, width, 0), apply_geometry=False)
+        # Qt asks for the same widths many times while negotiating a resize
+        height = self._height_cache.get(width)
+        if height is None:
+            height = self._do_layout(QRect(0, 0, width, 0), apply_geometry=False)
+            self._height_cache[width] = height
+        return height
 
     def setGeometry(self, rect: QRect) -> None:  # type: ignore[override]
         super().setGeometry(rect)
+        # QScrollArea re-sends the same rect a lot; children are already
+        # placed for it unless something was invalidated since
+        if rect == self._last_geom_rect:
+            return
         self._do_layout(rect, apply_geometry=True)
+        self._last_geom_rect = QRect(rect)
 
     def sizeHint(self) -> QSize:  # type: ignore[override]
         return self.minimumSize()
 
     def minimumSize(self) -> QSize:  # type: ignore[override]
-        # Calculate the size of the largest child to ensure we don't crush items
-        size = QSize()
-        for item in self._item_list:
-            size = size.expandedTo(item.minimumSize())
-        
-        # Add margins
-        m = self.contentsMargins()
-        size += QSize(m.left() + m.right(), m.top() + m.bottom())
-        return size
+        if self._min_size_cache is None:
+            # Calculate the size of the largest child to ensure we don't crush items
+            size = QSize()
+            for item in self._item_list:
+                size = size.expandedTo(item.minimumSize())
+            
+            # Add margins
+            m = self.contentsMargins()
+            size += QSize(m.left() + m.right(), m.top() + m.bottom())
+            self._min_size_cache = size
+        # Hand out a copy, QSize is mutable
+        return QSize(self._min_size_cache)
+
+    def invalidate(self) -> None:  # type: ignore[override]
+        self._clear_caches()
+        super().invalidate()
+
+    def _clear_caches(self) -> None:
+        self._height_cache.clear()
+        self._min_size_cache = None
+        self._last_geom_rect = None
+        self._sizes = None
+
+    # --- Item Properties ---
+
+    def refresh_meta(self, widget: QWidget) -> None:
+        """
+        Re-reads "base_point" and "force_new_line" for a widget already in
+        the layout. Call after changing either property post-insertion.
+        """
+        for index, item in enumerate(self._item_list):
+            if item.widget() is widget:
+                self._item_meta[index] = self._read_meta(item)
+                self.invalidate()
+                return
+
+    def _read_meta(self, item: QLayoutItem) -> Tuple[Optional[int], bool]:
+        widget = item.widget()
+        if not widget:
+            return None, False
+
+        base_point = widget.property("base_point")
+        if not isinstance(base_point, int):
+            base_point = None
+        force_break = bool(widget.property("force_new_line") or False)
+        return base_point, force_break
 
     # --- Layout Logic ---
 
-    def _get_alignment_point(self, item: QLayoutItem, item_height: int) -> int:
-        widget = item.widget()
-        if widget:
-            base_point = widget.property("base_point")
-            if base_point is not None and isinstance(base_point, int):
-                return base_point
+    def _get_alignment_point(self, base_point: Optional[int], item_height: int) -> int:
+        if base_point is not None:
+            return base_point
         return item_height // 2
 
+    def _measure(self, spacing: int) -> List[QSize]:
+        """
+        Reads every item's size hint and ascent once, until the layout is
+        invalidated. _cum_widths[k] is the width of items [0, k) with one
+        spacing after each, so the items [s, e) fit on a line of width W
+        exactly when _cum_widths[e] <= _cum_widths[s] + W + spacing.
+        """
+        if self._sizes is None or spacing != self._cum_spacing:
+            self._sizes = [item.sizeHint() for item in self._item_list]
+            self._ascents = [
+                self._get_alignment_point(base_point, size.height())
+                for size, (base_point, _) in zip(self._sizes, self._item_meta)
+            ]
+            self._cum_widths = list(
+                accumulate((size.width() + spacing for size in self._sizes), initial=0)
+            )
+            self._cum_spacing = spacing
+            # A forced break on the first item has no line to end
+            self._break_indexes = [
+                index for index, (_, force_break) in enumerate(self._item_meta)
+                if force_break and index > 0
+            ]
+        return self._sizes
+
     def _do_layout(self, rect: QRect, apply_geometry: bool = False) -> int:
-        x = rect.x()
         y = rect.y()
         effective_width = rect.width()
         spacing = self.spacing()
@@ -99,22 +186,24 @@ class FlowLayout(QLayout):
         if apply_geometry:
             self._line_debug_positions.clear()
 
-        line_items: List[QLayoutItem] = []
+        sizes = self._measure(spacing)
+        ascents = self._ascents
+        cum_widths = self._cum_widths
+        break_indexes = self._break_indexes
 
         def process_line(
-            current_items: List[QLayoutItem], current_y: int, is_dry_run: bool
+            start: int,
+            end: int,
+            current_y: int,
+            is_dry_run: bool,
         ) -> int:
-            if not current_items:
-                return current_y
-
             max_ascent = 0
             max_descent = 0
 
             # 1. Measure Line Height
-            for item in current_items:
-                size = item.sizeHint()
-                ascent = self._get_alignment_point(item, size.height())
-                descent = size.height() - ascent
+            for index in range(start, end):
+                ascent = ascents[index]
+                descent = sizes[index].height() - ascent
                 max_ascent = max(max_ascent, ascent)
                 max_descent = max(max_descent, descent)
 
@@ -134,44 +223,33 @@ class FlowLayout(QLayout):
             if not is_dry_run:
                 self._line_debug_positions.append((final_baseline_y, effective_width))
                 current_x_cursor = rect.x()
-                for item in current_items:
-                    size = item.sizeHint()
-                    ascent = self._get_alignment_point(item, size.height())
-                    item_y = final_baseline_y - ascent
-                    item.setGeometry(QRect(QPoint(current_x_cursor, item_y), size))
+                for index in range(start, end):
+                    size = sizes[index]
+                    item_y = final_baseline_y - ascents[index]
+                    self._item_list[index].setGeometry(
+                        QRect(QPoint(current_x_cursor, item_y), size)
+                    )
                     current_x_cursor += size.width() + spacing
 
             return (final_baseline_y + max_descent) + spacing
 
-        current_x = 0
         current_y_cursor = y
-        
-        for item in self._item_list:
-            size = item.sizeHint()
-            widget = item.widget()
-            
-            force_break = False
-            if widget:
-                force_break = widget.property("force_new_line") or False
+        count = len(sizes)
+        start = 0
+
+        while start < count:
+            # Wrap Logic: a line never runs past the next forced break, and
+            # within that holds every item whose right edge fits the width.
+            # Each line takes at least one item, however wide.
+            next_break = bisect_right(break_indexes, start)
+            stop = break_indexes[next_break] if next_break < len(break_indexes) else count
+            limit = cum_widths[start] + effective_width + spacing
+            end = bisect_right(cum_widths, limit, start + 2, stop + 1) - 1
 
-            next_x = current_x + size.width()
-            
-            # Wrap Logic
-            if len(line_items) > 0 and (next_x > effective_width or force_break):
-                current_y_cursor = process_line(
-                    line_items, current_y_cursor, not apply_geometry
-                )
-                line_items = []
-                current_x = 0
-                next_x = size.width()
-
-            line_items.append(item)
-            current_x = next_x + spacing
-
-        if line_items:
             current_y_cursor = process_line(
-                line_items, current_y_cursor, not apply_geometry
+                start, end, current_y_cursor, not apply_geometry
             )
+            start = end
 
         return current_y_cursor - rect.y()
 
@@ -1,13 +1,19 @@
-import pandas as pd
+import csv
 import json
 import os
 import sys
 
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
 INPUT_FILE = os.path.abspath('data/processed/search_db.csv')
 OUTPUT_FILE = os.path.abspath('data/processed/ingredients_trie.json')
 ID_COL = 'id'
 INGREDIENTS_COL = 'ingredients_serialized'
 SEPARATOR = ';'
+CSV_FIELD_LIMIT = 2**31 - 1
 
 def get_file_mtime(filepath):
     """Returns the modification time of a file."""
@@ -16,24 +22,49 @@ def get_file_mtime(filepath):
     except OSError:
         return 0
 
+def parse_id(value):
+    """Returns the id as an int when it is numeric."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
 def add_to_trie(trie, word, doc_id):
     """
     Inserts a word into the trie and adds the doc_id to the leaf node's set.
     """
     node = trie
     for char in word.lower().strip():
-        if char not in node:
-            node[char] = {}
-        node = node[char]
-    if "__ids__" not in node:
-        node["__ids__"] = set()
-    node["__ids__"].add(doc_id)
+        # One probe when the child exists, unlike `in` + `[]`
+        child = node.get(char)
+        if child is None:
+            child = node[char] = {}
+        node = child
+    doc_ids = node.get("__ids__")
+    if doc_ids is None:
+        doc_ids = node["__ids__"] = set()
+    doc_ids.add(doc_id)
 
-def set_default(obj):
-    """Helper to serialize sets to lists for JSON."""
-    if isinstance(obj, set):
-        return list(obj)
-    raise TypeError
+def id_sort_key(doc_id):
+    """
+    Orders numeric ids first, then ids parse_id left as strings, then the
+    None a short row without an id cell gives.
+    """
+    if doc_id is None:
+        return 2, 0
+    return (1 if isinstance(doc_id, str) else 0), doc_id
+
+def sets_to_lists(node):
+    """
+    Replaces every "__ids__" set with a sorted list, in place, so the
+    encoders never have to call back into Python for a type they can't
+    handle and the output doesn't depend on set iteration order.
+    """
+    for key, value in node.items():
+        if key == "__ids__":
+            node[key] = sorted(value, key=id_sort_key)
+        else:
+            sets_to_lists(value)
 
 def generate_ingredients_trie():
     input_mtime = get_file_mtime(INPUT_FILE)
@@ -44,23 +75,48 @@ def generate_ingredients_trie():
         return
 
     print(f"Source data changed or output missing. Generating Trie...")
+    trie_root = {}
     try:
-        df = pd.read_csv(INPUT_FILE, usecols=[ID_COL, INGREDIENTS_COL])
+        f = open(INPUT_FILE, newline='', encoding='utf-8-sig')
     except FileNotFoundError:
         print(f"Error: {INPUT_FILE} not found.")
         sys.exit(1)
-    trie_root = {}
-    for doc_id, ingredients_str in zip(df[ID_COL], df[INGREDIENTS_COL]):
-        if pd.isna(ingredients_str):
-            continue
-        ingredients = str(ingredients_str).split(SEPARATOR)
-        
-        for ingredient in ingredients:
-            if ingredient.strip():
-                add_to_trie(trie_root, ingredient, doc_id)
+    old_limit = csv.field_size_limit(CSV_FIELD_LIMIT)
+    with f:
+        try:
+            # Stream rows one at a time instead of loading the whole file
+            for row in csv.DictReader(f):
+                ingredients_str = row[INGREDIENTS_COL]
+                if not ingredients_str:
+                    continue
+                doc_id = parse_id(row[ID_COL])
+                ingredients = ingredients_str.split(SEPARATOR)
+
+                for ingredient in ingredients:
+                    if ingredient.strip():
+                        add_to_trie(trie_root, ingredient, doc_id)
+        except csv.Error as e:
+            print(f"Error: could not parse {INPUT_FILE}: {e}")
+            sys.exit(1)
+        finally:
+            csv.field_size_limit(old_limit)
     print(f"Saving to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(trie_root, f, default=set_default, separators=(',', ':'))
+    # Neither encoder takes sets; converting them up front keeps the whole
+    # dump in C instead of a default= callback per set
+    sets_to_lists(trie_root)
+    data = None
+    if orjson is not None:
+        try:
+            data = orjson.dumps(trie_root)
+        except orjson.JSONEncodeError:
+            # orjson stops at 64-bit ints; the stdlib encoder takes any id
+            data = None
+    if data is not None:
+        with open(OUTPUT_FILE, 'wb') as f:
+            f.write(data)
+    else:
+        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+            json.dump(trie_root, f, separators=(',', ':'))
     
     print("Done.")
 
@@ -0,0 +1,12 @@
+import os
+
+import pytest
+
+# No display is needed to lay widgets out
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
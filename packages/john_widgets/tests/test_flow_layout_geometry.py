@@ -0,0 +1,207 @@
+import random
+
+import pytest
+from PyQt6.QtCore import QRect
+from PyQt6.QtWidgets import QWidget
+
+from john_widgets.flow_layout import FlowLayout
+
+WIDTH = 200
+
+# (width, height, properties); 60 + 10 + 50 fills exactly 120 px
+BOXES = [
+    (60, 20, {}),
+    (50, 40, {"base_point": 5}),
+    (90, 10, {}),
+    (30, 30, {"force_new_line": True}),
+    (260, 12, {}),  # wider than WIDTH, gets a line of its own
+    (40, 16, {}),
+    (70, 50, {"base_point": 0}),
+    (20, 8, {}),
+]
+
+
+@pytest.fixture
+def flow(qapp):
+    parent = QWidget()
+    layout = FlowLayout(parent)
+    for width, height, props in BOXES:
+        box = QWidget()
+        box.setFixedSize(width, height)
+        for name, value in props.items():
+            box.setProperty(name, value)
+        layout.addWidget(box)
+    parent.show()
+    yield layout
+    parent.close()
+
+
+def _widgets(layout):
+    return [layout.itemAt(i).widget() for i in range(layout.count())]
+
+
+def _geometries(layout, width=WIDTH):
+    layout.setGeometry(QRect(0, 0, width, 1000))
+    return [widget.geometry().getRect() for widget in _widgets(layout)]
+
+
+def _reference_layout(layout, width=WIDTH):
+    """
+    Lays the widgets out the way FlowLayout always has: fill a line until
+    the next right edge passes 'width' or a widget forces a break, then line
+    the widgets up on their ascent. Returns the rects and the total height.
+    """
+    spacing = layout.spacing()
+    lines, line, x = [], [], 0
+    for widget in _widgets(layout):
+        if line and (x + widget.minimumWidth() > width or widget.property("force_new_line")):
+            lines.append(line)
+            line, x = [], 0
+        line.append(widget)
+        x += widget.minimumWidth() + spacing
+    if line:
+        lines.append(line)
+
+    rects, y = [], 0
+    for line in lines:
+        sizes = [widget.minimumSize() for widget in line]
+        ascents = [
+            widget.property("base_point") if isinstance(widget.property("base_point"), int)
+            else size.height() // 2
+            for widget, size in zip(line, sizes)
+        ]
+        max_ascent = max(ascents)
+        baseline = y + max_ascent
+        if layout.grid_enabled:
+            grid = layout.grid_size
+            baseline = -(-max(baseline - layout.grid_offset, 0) // grid) * grid + layout.grid_offset
+            while baseline - max_ascent < y:
+                baseline += grid
+        x = 0
+        for size, ascent in zip(sizes, ascents):
+            rects.append((x, baseline - ascent, size.width(), size.height()))
+            x += size.width() + spacing
+        y = baseline + max(size.height() - ascent for size, ascent in zip(sizes, ascents)) + spacing
+    return rects, y
+
+
+def test_height_for_width_follows_resized_widget(flow):
+    before = flow.heightForWidth(WIDTH)
+    assert before == _reference_layout(flow)[1]
+
+    _widgets(flow)[1].setFixedSize(50, 90)
+    assert flow.heightForWidth(WIDTH) == _reference_layout(flow)[1] != before
+    assert _geometries(flow) == _reference_layout(flow)[0]
+
+
+def test_minimum_size_follows_resized_and_removed_widgets(flow):
+    margins = flow.contentsMargins()
+    margins = margins.left() + margins.right()
+    assert flow.minimumSize().width() == 260 + margins
+
+    widest = _widgets(flow)[4]
+    widest.setFixedSize(300, 12)
+    assert flow.minimumSize().width() == 300 + margins
+
+    flow.removeWidget(widest)
+    assert flow.minimumSize().width() == 90 + margins
+
+
+def test_height_for_width_follows_removal(flow):
+    before = flow.heightForWidth(WIDTH)
+    flow.removeWidget(_widgets(flow)[6])
+    assert flow.heightForWidth(WIDTH) == _reference_layout(flow)[1] != before
+    assert _geometries(flow) == _reference_layout(flow)[0]
+
+
+def test_invalidate_drops_cached_heights(flow):
+    before = flow.heightForWidth(WIDTH), _geometries(flow)
+
+    # The grid settings say to call invalidate() after changing them
+    flow.grid_enabled = True
+    flow.grid_size = 32
+    flow.invalidate()
+    after = flow.heightForWidth(WIDTH), _geometries(flow)
+    assert after != before
+    assert after == (_reference_layout(flow)[1], _reference_layout(flow)[0])
+
+    # setSpacing() invalidates by itself
+    flow.setSpacing(3)
+    assert flow.heightForWidth(WIDTH) == _reference_layout(flow)[1] != after[0]
+
+
+def test_repeated_rect_is_not_laid_out_again(flow):
+    _geometries(flow)
+    box = _widgets(flow)[0]
+    box.move(500, 500)
+    # Nothing changed since, so the same rect leaves the children alone
+    _geometries(flow)
+    assert box.pos().x() == 500
+
+
+@pytest.mark.parametrize("change", ["resize", "remove", "invalidate"])
+def test_repeated_rect_is_laid_out_after_a_change(flow, change):
+    before = _geometries(flow)
+    widgets = _widgets(flow)
+    if change == "resize":
+        widgets[0].setFixedSize(120, 20)
+    elif change == "remove":
+        flow.removeWidget(widgets[0])
+        before = before[1:]
+    else:
+        flow.grid_enabled = True
+        flow.invalidate()
+    after = _geometries(flow)
+    assert after != before
+    assert after == _reference_layout(flow)[0]
+
+
+@pytest.mark.parametrize("index, name, value", [
+    (1, "force_new_line", True),
+    (3, "force_new_line", False),
+    (5, "base_point", 12),
+    (1, "base_point", None),
+])
+def test_refresh_meta_picks_up_property_changes(flow, index, name, value):
+    before = _geometries(flow)
+    widget = _widgets(flow)[index]
+    widget.setProperty(name, value)
+    # Properties are snapshotted on insertion, so the change alone is ignored
+    flow.invalidate()
+    assert _geometries(flow) == before
+
+    flow.refresh_meta(widget)
+    after = _geometries(flow)
+    assert after != before
+    assert after == _reference_layout(flow)[0]
+
+
+@pytest.mark.parametrize("width", [1, 119, 120, 121, 200, 259, 260, 261, 1000])
+@pytest.mark.parametrize("spacing", [0, 10, 25])
+def test_line_breaks_match_reference(flow, width, spacing):
+    flow.setSpacing(spacing)
+    rects, height = _reference_layout(flow, width)
+    assert flow.heightForWidth(width) == height
+    assert _geometries(flow, width) == rects
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_line_breaks_match_reference(qapp, seed):
+    rng = random.Random(seed)
+    parent = QWidget()
+    layout = FlowLayout(parent)
+    for _ in range(80):
+        box = QWidget()
+        box.setFixedSize(rng.randint(1, 150), rng.randint(1, 60))
+        if rng.random() < 0.1:
+            box.setProperty("force_new_line", True)
+        layout.addWidget(box)
+    parent.show()
+
+    for width in (1, 90, 150, 333, 600):
+        layout.grid_enabled = width == 333
+        layout.invalidate()
+        rects, height = _reference_layout(layout, width)
+        assert layout.heightForWidth(width) == height
+        assert _geometries(layout, width) == rects
+    parent.close()
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from john_widgets import generate_trie
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    source = tmp_path / "search_db.csv"
+    output = tmp_path / "ingredients_trie.json"
+    monkeypatch.setattr(generate_trie, "INPUT_FILE", str(source))
+    monkeypatch.setattr(generate_trie, "OUTPUT_FILE", str(output))
+    return source, output
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(generate_trie, "orjson", None)
+    elif generate_trie.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def _generate(source, output, text):
+    source.write_text(text, encoding="utf-8")
+    generate_trie.generate_ingredients_trie()
+    return json.loads(output.read_text(encoding="utf-8"))
+
+
+def _ids(trie, word):
+    node = trie
+    for char in word:
+        node = node[char]
+    return node["__ids__"]
+
+
+def test_ids_are_written_sorted(paths, encoder):
+    trie = _generate(*paths, "ingredients_serialized,id\n"
+                             "salt,10\nSalt,2\nsalt,abc\nsalt,9\nsalt\n")
+    # The last row is short, so its id cell is missing entirely
+    assert _ids(trie, "salt") == [2, 9, 10, "abc", None]
+
+
+def test_output_is_reproducible(paths, encoder):
+    text = "id,ingredients_serialized\n" + "".join(f"{i},salt;sugar\n" for i in range(200, 0, -1))
+    trie = _generate(*paths, text)
+    first = paths[1].read_bytes()
+    paths[1].unlink()
+    _generate(*paths, text)
+    assert paths[1].read_bytes() == first
+    assert _ids(trie, "sugar") == list(range(1, 201))
+
+
+def test_ids_past_64_bits_fall_back_to_json(paths, encoder):
+    trie = _generate(*paths, "id,ingredients_serialized\n"
+                             "123456789012345678901234567890,salt\n1,salt\n")
+    assert _ids(trie, "salt") == [1, 123456789012345678901234567890]